@@ -11,11 +11,16 @@ import argparse
 import codecs
 import collections
 import csv
+import errno
 import cStringIO
 import glob
+import hashlib
+import multiprocessing
 import os.path
 import sys
 import textwrap
+import time
+import unicodedata
 from xml.etree import ElementTree
 
 # Third-party
@@ -40,9 +45,16 @@ weapon_tags_range = ["Hand", "Close", "Reach", "Near", "Far"]
 
 yaml_tag = u"tag:yaml.org,2002:map"
 monsters = dict()
-xml_files = set()
-yaml_files = set()
 index = None
+index_path = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                          "index.yaml")
+index_missing = dict()
+index_problems = list()
+monster_sources = dict()
+source_records = dict()
+card_cache = dict()
+card_keys = set()
+plain_wrappers = dict()
 
 
 # From official Python documetnation for csv module:
@@ -117,6 +129,18 @@ def parser_setup():
     ap.add_argument("--back-image", metavar="FILE",
                     help="Image to use for back of monster cards (requires"
                          " --back-pdf)")
+    ap.add_argument("--width", metavar="N", type=int, default=80,
+                    help="Line width of plain text output (default: 80)")
+    ap.add_argument("--stream", action="store_true",
+                    help="Write each plain text entry as soon as it is"
+                         " created (handy for paging)")
+    ap.add_argument("--split-by", choices=("setting", "tag", "org"),
+                    help="Create a PDF or CSV for each setting, tag, or"
+                         " organization tag (--pdf or --csv is a DIR)")
+    ap.add_argument("--watch", action="store_true",
+                    help="Recreate output when source files change,"
+                         " reusing unchanged PDF cards (not available with"
+                         " --back-pdf)")
     out = ap.add_argument_group(title="Output Arguments",
                                 description="Mutually exclusive arguments"
                                             " that determine type of output.")
@@ -124,8 +148,14 @@ def parser_setup():
     dst.add_argument("--back-pdf", metavar="FILE",
                      help="Create PDF of back of monster cards (requires"
                           " --back-image)")
+    dst.add_argument("--check", action="store_true",
+                     help="Validate monster and setting references against"
+                          " index YAML and report all problems")
     dst.add_argument("--csv", metavar="FILE",
                      help="Create CSV of monsters")
+    dst.add_argument("--index", metavar="FILE",
+                     help="Create index YAML of monster and setting"
+                          " references")
     dst.add_argument("--pdf", metavar="FILE",
                      help="Create PDF of monster cards")
     dst.add_argument("--plain", action="store_true",
@@ -146,6 +176,21 @@ def parser_setup():
     # Ensure source files provided
     if not args.back_pdf and not args.file:
         ap.error("Source FILE(s) required")
+    # Ensure plain text fits list item indentation
+    if args.width < 40:
+        ap.error("--width must be at least 40")
+    # Ensure split decks are written to a directory
+    if args.split_by:
+        if not (args.pdf or args.csv) or (args.csv == "-"):
+            ap.error("--split-by requires --pdf DIR or --csv DIR")
+        split_dir = args.pdf or args.csv
+        if os.path.exists(split_dir) and not os.path.isdir(split_dir):
+            ap.error("--split-by output %s is not a directory" % split_dir)
+        if args.watch:
+            ap.error("--split-by and --watch cannot be used together")
+    # Ensure source files can be watched
+    if args.watch and args.back_pdf:
+        ap.error("--watch requires source FILE(s) (not --back-pdf)")
     return args
 
 
@@ -156,7 +201,7 @@ def parse_xml(xml_file):
     body = tree.find("Body")
     second = False
     setting = tree.find("h1").text
-    setting_reference = index["settings"][setting]
+    setting_reference = index_lookup("settings", setting, xml_file)
     for element in body:
         if element.tag == "p":
             style = element.attrib[
@@ -187,7 +232,8 @@ def parse_xml(xml_file):
                 m["setting_reference"] = setting_reference
 
                 m["name"] = element.text.strip()
-                m["reference"] = index["monsters"][m["name"].lower()]
+                m["reference"] = index_lookup("monsters", m["name"],
+                                              xml_file)
                 # Tags
                 if len(element) > 0:
                     for tag in element[0].text.split(","):
@@ -270,7 +316,7 @@ def parse_xml(xml_file):
                 m["moves"].append(item.text)
 
             # END - ul is last element in monster_setting XML files
-            monsters[m["name"]] = m
+            monster_add(m, xml_file)
 
 
 def parse_yaml(yaml_file):
@@ -297,35 +343,117 @@ def parse_yaml(yaml_file):
     m["setting_reference"] = None
     with open(yaml_file, "r") as stream:
         temp = yaml.safe_load(stream)
+        # Reject empty or partially written files (ex. while saving)
+        if not isinstance(temp, dict) or "name" not in temp:
+            raise ValueError("%s: not a YAML mapping with monster name"
+                             % yaml_file)
         for key in temp:
             if key != "weapon":
                 m[key] = temp[key]
             else:
                 for key in temp["weapon"]:
                     m["weapon"][key] = temp["weapon"][key]
+    monster_add(m, yaml_file)
+
+
+def monster_add(monster_dict, source_file):
+    """Add monster to monsters dict, noting duplicates from other source
+    files.
+    """
+    m = monster_dict
+    key = index_key(m["name"])
+    source_records.setdefault(source_file, dict())[key] = m
+    current = monster_sources.get(key)
+    if current and current != source_file:
+        index_problems.append(u"Duplicate monster %s: %s and %s"
+                              % (m["name"], source_label(current),
+                                 source_label(source_file)))
+        # Re-parsed file (ex. --watch) must not replace a later source
+        if source_order(source_file) < source_order(current):
+            return
+        del monsters[source_records[current][key]["name"]]
+    monster_sources[key] = source_file
     monsters[m["name"]] = m
 
 
+def source_order(source_file):
+    """Return sort key of source file precedence (XML before YAML, then by
+    path). Monsters from later source files replace earlier ones.
+    """
+    return (not source_file.endswith(".xml"), source_file)
+
+
+def index_key(name):
+    """Normalize monster or setting name for index lookups (unicode
+    normalized, lowercase).
+    """
+    return unicodedata.normalize("NFKC", u"%s" % name).strip().lower()
+
+
+def source_label(source_file):
+    """Return source file path as unicode for problem messages (paths are
+    byte strings, ex. doppelgänger.yaml).
+    """
+    if isinstance(source_file, unicode):
+        return source_file
+    encoding = sys.getfilesystemencoding() or "utf-8"
+    return source_file.decode(encoding, "replace")
+
+
+def index_load(index_file):
+    """Load index YAML file into normalized lookup dicts. Duplicate entries
+    (including those only differing by case or unicode form) are noted.
+    """
+    with open(index_file, "r") as stream:
+        # Compose instead of load so duplicate keys are not silently dropped
+        root = yaml.compose(stream, Loader=yaml.SafeLoader)
+    loaded = {"monsters": dict(), "settings": dict()}
+    for section_node, mapping_node in root.value:
+        section = section_node.value
+        if section not in loaded:
+            continue
+        for name_node, page_node in mapping_node.value:
+            key = index_key(name_node.value)
+            if key in loaded[section]:
+                index_problems.append(u"Duplicate %s index entry: %s"
+                                      % (section[:-1], name_node.value))
+            loaded[section][key] = int(page_node.value)
+    return loaded
+
+
+def index_lookup(section, name, source_file):
+    """Return page reference of monster or setting name, noting missing
+    entries instead of failing on the first one.
+    """
+    try:
+        return index[section][index_key(name)]
+    except KeyError:
+        problems = index_missing.setdefault(source_file, list())
+        problems.append(u"Missing %s index entry: %s (%s)"
+                        % (section[:-1], name, source_label(source_file)))
+        return None
+
+
 def combine_monster_tags(monster_dictionary, formatted=False):
     """Combine monster tags into categorized and sorted string.
     """
     m = monster_dictionary
     tags_combined = None
+    # Monster dictionary is not modified (it may be rendered again)
     if m["tags_desc"]:
-        m["tags_desc"].sort()
-        tags_combined = ", ".join(m["tags_desc"])
+        tags_combined = ", ".join(sorted(m["tags_desc"]))
     if m["tags_org"]:
-        m["tags_org"] = ", ".join(m["tags_org"])
+        tags_org = ", ".join(m["tags_org"])
         if tags_combined:
-            tags_combined = "%s ~ %s" % (tags_combined, m["tags_org"])
+            tags_combined = "%s ~ %s" % (tags_combined, tags_org)
         else:
-            tags_combined = m["tags_org"]
+            tags_combined = tags_org
     if m["tags_size"]:
-        m["tags_size"] = ", ".join(m["tags_size"])
+        tags_size = ", ".join(m["tags_size"])
         if tags_combined:
-            tags_combined = "%s ~ %s" % (tags_combined, m["tags_size"])
+            tags_combined = "%s ~ %s" % (tags_combined, tags_size)
         else:
-            tags_combined = m["tags_size"]
+            tags_combined = tags_size
     if formatted:
         if tags_combined:
             tags_combined = "<i>%s</i>" % tags_combined
@@ -346,11 +474,11 @@ def combine_weapon(monster_dictionary, formatted=False):
     if w["tags_desc"]:
         tags = ", ".join(w["tags_desc"])
     if w["tags_range"]:
-        w["tags_range"] = ", ".join(w["tags_range"])
+        tags_range = ", ".join(w["tags_range"])
         if tags:
-            tags = "%s ~ %s" % (tags, w["tags_range"])
+            tags = "%s ~ %s" % (tags, tags_range)
         else:
-            tags = w["tags_range"]
+            tags = tags_range
     if tags:
         if formatted:
             weapon = "%s<br /><i>%s</i>" % (weapon, tags)
@@ -376,9 +504,28 @@ def csv_write_row(monster_dict):
 
 
 def pdf_create_page(monster_dict):
-    """Create PDF pages of formatted monster cards.
+    """Create PDF pages of formatted monster cards. In watch mode card
+    flowables are cached by a hash of the monster dictionary and style
+    settings, so unchanged cards are not constructed again when the document
+    is rebuilt (doc.build still wraps and draws every card).
+    """
+    if not args.watch:
+        # Single build, cache would not be used again
+        elements.extend(pdf_card_elements(monster_dict))
+        return
+    key = hashlib.sha1(repr((monster_dict, font_default, font_title, bullet,
+                             box_width, spacer))).hexdigest()
+    card_keys.add(key)
+    if key not in card_cache:
+        card_cache[key] = pdf_card_elements(monster_dict)
+    elements.extend(card_cache[key])
+
+
+def pdf_card_elements(monster_dict):
+    """Return list of flowables for a single formatted monster card.
     """
     m = monster_dict
+    card = list()
     # Name, HP, Armor, References
     hp_label = None
     hp_value = None
@@ -390,6 +537,7 @@ def pdf_create_page(monster_dict):
     if m["armor"]:
         armor_label = "Armor:"
         armor_value = m["armor"]
+    reference = ""
     name = m["name"].upper()
     words = list()
     for word in name.split(" "):
@@ -417,8 +565,8 @@ def pdf_create_page(monster_dict):
              ("FONT", (1, 0), (2, 1), font_default, 8),
              ("ALIGN", (1, 0), (2, 1), "RIGHT"),
              ]
-    elements.append(Table(table, [(4.4 * inch) - 8, 0.4 * inch, 0.2 * inch],
-                          style=style))
+    card.append(Table(table, [(4.4 * inch) - 8, 0.4 * inch, 0.2 * inch],
+                      style=style))
     # Tags
     monster_tags = combine_monster_tags(m, formatted=True)
     if monster_tags:
@@ -439,9 +587,9 @@ def pdf_create_page(monster_dict):
              ("TOPPADDING", (0, 0), (1, 0), 0),
              ("VALIGN", (0, 0), (1, 0), "TOP"),
              ]
-    elements.append(Table(table, [None, None], style=style))
+    card.append(Table(table, [None, None], style=style))
 
-    elements.append(Spacer(box_width, spacer))
+    card.append(Spacer(box_width, spacer))
 
     # Qualities
     if m["qualities"]:
@@ -494,10 +642,10 @@ def pdf_create_page(monster_dict):
 
     table = [[qualities_and_instinct_table, moves_table]]
     style = [("VALIGN", (0, 0), (1, 0), "TOP")]
-    elements.append(Table(table, style=style))
+    card.append(Table(table, style=style))
 
     # Description
-    elements.append(Spacer(box_width, spacer))
+    card.append(Spacer(box_width, spacer))
     table = [[Paragraph(m["description"], style_desc)]]
     style = [("LINEABOVE", (0, 0), (0, 0), 0.5, colors.black),
              ("LEFTPADDING", (0, 0), (0, 0), 0),
@@ -506,98 +654,118 @@ def pdf_create_page(monster_dict):
              ("TOPPADDING", (0, 0), (0, 0), (spacer / 2)),
              ("VALIGN", (0, 0), (0, 0), "TOP"),
              ]
-    elements.append(Table(table, [box_width - 8],
-                          style=style))
+    card.append(Table(table, [box_width - 8],
+                      style=style))
 
     # Next card
-    elements.append(FrameBreak())
+    card.append(FrameBreak())
+    return card
 
 
-def plain_write(monster_dict):
-    """Output plain text monster entries.
+def plain_wrapper(label, width):
+    """Return cached TextWrapper for plain text list items (label is only used
+    by the first item) or, if label is None, for paragraphs.
+    """
+    key = (label, width)
+    if key not in plain_wrappers:
+        if label is None:
+            wrapper = textwrap.TextWrapper(width=width)
+        else:
+            wrapper = textwrap.TextWrapper(width=width,
+                                           initial_indent=u"%-10s> " % label,
+                                           subsequent_indent=u"%12s" % "")
+        plain_wrappers[key] = wrapper
+    return plain_wrappers[key]
+
+
+def plain_entry(monster_dict, width=80):
+    """Return plain text monster entry.
     """
     m = monster_dict
-    print("=" * 80)
+    lines = list()
+    lines.append(u"=" * width)
     # Name, HP, and Armor
     if m["hp"]:
-        print(u"%-70s%6s%4d" % (m["name"].upper(), "HP:", m["hp"]))
+        lines.append(u"%-*s%6s%4d" % (width - 10, m["name"].upper(), "HP:",
+                                      m["hp"]))
     else:
-        print(m["name"].upper())
+        lines.append(m["name"].upper())
     if m["armor"]:
-        print(u"%76s%4d" % ("Armor:", m["armor"]))
+        lines.append(u"%*s%4d" % (width - 4, "Armor:", m["armor"]))
     # Tags
     tags = combine_monster_tags(m)
     if tags:
-        print(tags)
+        lines.append(plain_wrapper(None, width).fill(tags))
     # Weapon
     weapon = combine_weapon(m)
     if weapon:
-        print(weapon)
+        lines.append(plain_wrapper(None, width).fill(weapon))
     # Instinct
-    print("Instinct: " + m["instinct"])
-    # Moves
-    if m["moves"]:
-        leader = textwrap.TextWrapper(width=80,
-                                      initial_indent=u"%-10s> " % "Moves",
-                                      subsequent_indent=u"%12s" % "")
-        print(leader.fill(m["moves"].pop(0)))
-        follow = textwrap.TextWrapper(width=80,
-                                      initial_indent=u"%-10s> " % "",
-                                      subsequent_indent=u"%12s" % "")
-        for move in m["moves"]:
-            print(follow.fill(move))
-    # Qualities
-    if m["qualities"]:
-        leader = textwrap.TextWrapper(width=80,
-                                      initial_indent=u"%-10s> " % "Qualities",
-                                      subsequent_indent=u"%12s" % "")
-        print(leader.fill(m["qualities"].pop(0)))
-        follow = textwrap.TextWrapper(width=80,
-                                      initial_indent=u"%-10s> " % "",
-                                      subsequent_indent=u"%12s" % "")
-        for quality in m["qualities"]:
-            print(follow.fill(quality))
+    lines.append(plain_wrapper(None, width).fill(u"Instinct: " +
+                                                 m["instinct"]))
+    # Moves and Qualities
+    for label, items in (("Moves", m["moves"]),
+                         ("Qualities", m["qualities"])):
+        for item in items:
+            lines.append(plain_wrapper(label, width).fill(item))
+            label = ""
     # Description
     if m["description"]:
-        print("-" * 80)
+        lines.append(u"-" * width)
         # Cleanup italics (ex. Fire Beetle)
         description = m["description"].replace("<i>", "").replace("</i>", "")
         if "<br />" in description:
             # Multilined description (ex. Treant)
-            description = description.replace("<br />", "\n")
-            print(description)
+            for paragraph in description.split("<br />"):
+                lines.append(plain_wrapper(None, width).fill(paragraph))
         else:
             # Normal description
-            print(textwrap.fill(description, width=80))
-        print("-" * 80)
+            lines.append(plain_wrapper(None, width).fill(description))
+        lines.append(u"-" * width)
     # References
-    print(u"{: ^80}".format(u"%s of the %s" % (m["name"], m["setting"])))
+    references = [u"%s of the %s" % (m["name"], m["setting"])]
     if m["reference"] and m["setting_reference"]:
-        print(u"{: ^80}".format(u"[DW %d, %d]" % (m["reference"],
-                                                  m["setting_reference"])))
+        references.append(u"[DW %d, %d]" % (m["reference"],
+                                            m["setting_reference"]))
     elif m["setting_reference"]:
-        print(u"{: ^80}".format(u"[DW %d]" % (m["setting_reference"])))
-    print()
+        references.append(u"[DW %d]" % (m["setting_reference"]))
+    center = u"{: ^%d}" % width
+    for reference in references:
+        for line in plain_wrapper(None, width).wrap(reference):
+            lines.append(center.format(line))
+    lines.append(u"")
+    return u"\n".join(lines) + u"\n"
+
+
+def plain_write(text):
+    """Write plain text to stdout (UTF-8 if stdout encoding is unknown, ex.
+    pipe).
+    """
+    if isinstance(text, unicode):
+        text = text.encode(sys.stdout.encoding or "utf-8")
+    try:
+        sys.stdout.write(text)
+        sys.stdout.flush()
+    except IOError as e:
+        # Pager or other reader quit early
+        if e.errno != errno.EPIPE:
+            raise
+        sys.exit(0)
 
 
 #TODO: convert utf8 to ascii for filenames
 def yaml_write(monster_dict):
     """Write monster entries to their own YAML file.
     """
-    m = monster_dict
-    # Remove empty keys
-    bad_keys = list()
-    for key in m["weapon"]:
-        if not m["weapon"][key]:
-            bad_keys.append(key)
-    for key in bad_keys:
-        del m["weapon"][key]
-    bad_keys = list()
-    for key in m:
-        if not m[key]:
-            bad_keys.append(key)
-    for key in bad_keys:
-        del m[key]
+    # Copy without empty keys (monster dictionary may be written again)
+    m = collections.OrderedDict()
+    for key in monster_dict:
+        value = monster_dict[key]
+        if key == "weapon":
+            value = collections.OrderedDict((k, v) for k, v in value.items()
+                                            if v)
+        if value:
+            m[key] = value
     # Print or Write to file
     if args.yaml == "-":
         print(yaml.safe_dump(m, default_flow_style=False, width=70,
@@ -611,6 +779,360 @@ def yaml_write(monster_dict):
                            explicit_start=True)
 
 
+def index_check(monster_dict):
+    """Cross-check monster references against index.
+    """
+    m = monster_dict
+    source = monster_sources[index_key(m["name"])]
+    checks = (("monsters", m["name"], m["reference"]),
+              ("settings", m["setting"], m["setting_reference"]))
+    for section, name, reference in checks:
+        if not name:
+            continue
+        expected = index[section].get(index_key(name))
+        if expected is None:
+            index_problems.append(u"Missing %s index entry: %s (%s)"
+                                  % (section[:-1], name,
+                                     source_label(source)))
+        elif reference != expected:
+            index_problems.append(u"Mismatched %s reference: %s is %s,"
+                                  u" index is %d (%s)"
+                                  % (section[:-1], name, reference, expected,
+                                     source_label(source)))
+
+
+def index_write(monster_names):
+    """Write index YAML rebuilt from monster and setting references.
+    """
+    rebuilt = {"monsters": dict(), "settings": dict()}
+    for name in monster_names:
+        m = monsters[name]
+        entries = (("monsters", m["name"], m["reference"]),
+                   ("settings", m["setting"], m["setting_reference"]))
+        for section, name, reference in entries:
+            if not name or not reference:
+                continue
+            key = index_key(name)
+            if section == "settings":
+                # Settings retain their title case
+                key = name
+            previous = rebuilt[section].get(key)
+            if previous is not None and previous != reference:
+                index_problems.append(u"Conflicting %s reference: %s is %d"
+                                      u" and %d"
+                                      % (section[:-1], name, previous,
+                                         reference))
+            rebuilt[section][key] = reference
+    if args.index == "-":
+        print(yaml.safe_dump(rebuilt, default_flow_style=False,
+                             explicit_start=True), end="")
+    else:
+        with open(os.path.abspath(args.index), "w") as stream:
+            yaml.safe_dump(rebuilt, stream, default_flow_style=False,
+                           explicit_start=True)
+
+
+def csv_open():
+    """Open CSV output and write header row.
+    """
+    global csvwriter
+    if args.csv == "-":
+        csv_path = sys.stdout
+    else:
+        csv_path = os.path.abspath(args.csv)
+        csv_path = open(args.csv, "wb")
+    csvwriter = UnicodeWriter(csv_path, quoting=csv.QUOTE_ALL,
+                              lineterminator="\n")
+    csvwriter.writerow(("name", "tags", "hp", "armor", "weapon",
+                        "qualities", "instinct", "moves", "description",
+                        "reference", "setting", "setting_reference"))
+
+
+def pdf_build():
+    """Complete PDF document creation from created pages.
+    """
+    doc = BaseDocTemplate(args.pdf, pagesize=landscape(letter),
+                          showBoundry=True,
+                          leftMargin=horizontal_margin,
+                          rightMargin=horizontal_margin,
+                          topMargin=vertical_margin,
+                          bottomMargin=vertical_margin,
+                          title="Dungeon World Monster Cards",
+                          allowSplitting=False)
+    doc.addPageTemplates([PageTemplate(frames=frames)])
+    doc.build(elements)
+    # Drop cached cards not used by this build (ex. edited monsters)
+    for key in list(card_cache):
+        if key not in card_keys:
+            del card_cache[key]
+
+
+def sources_find():
+    """Return dict of XML and YAML source file paths matching FILE globs and
+    their modification times.
+    """
+    sources = dict()
+    for file_glob in args.file:
+        for path in glob.iglob(file_glob):
+            path = os.path.abspath(path)
+            if not path.endswith((".xml", ".yml", ".yaml")):
+                continue
+            try:
+                sources[path] = os.path.getmtime(path)
+            except OSError:
+                # Removed since glob (ex. editor swap file)
+                pass
+    return sources
+
+
+def source_remove(source_file):
+    """Remove monsters parsed from source file from monsters dict (and its
+    missing index entries).
+    """
+    index_missing.pop(source_file, None)
+    records = source_records.pop(source_file, dict())
+    for key, m in records.items():
+        if monster_sources.get(key) != source_file:
+            continue
+        del monster_sources[key]
+        del monsters[m["name"]]
+        # Restore monster this source file replaced (ex. XML by YAML)
+        others = [p for p in source_records if key in source_records[p]]
+        if others:
+            other = max(others, key=source_order)
+            monster_sources[key] = other
+            restored = source_records[other][key]
+            monsters[restored["name"]] = restored
+
+
+def sources_parse(source_files):
+    """Parse (or re-parse) source files into monsters dict. XML files are
+    parsed before YAML files, so YAML monsters replace XML monsters.
+    """
+    global index
+    xml_files = [p for p in source_files if p.endswith(".xml")]
+    yaml_files = [p for p in source_files if not p.endswith(".xml")]
+    # Index is loaded once, relative to this script (not working directory)
+    if index is None and (xml_files or args.check):
+        index = index_load(index_path)
+    for xml_file in sorted(xml_files):
+        source_remove(xml_file)
+        try:
+            parse_xml(xml_file)
+        except (AttributeError, IndexError, KeyError) as e:
+            # Well-formed XML without expected InDesign elements
+            raise ValueError("%s: unexpected XML structure (%r)"
+                             % (xml_file, e))
+    for yaml_file in sorted(yaml_files):
+        source_remove(yaml_file)
+        parse_yaml(yaml_file)
+
+
+def sources_report():
+    """Report all source problems at once. Returns False if missing index
+    references prevent creating outputs.
+    """
+    if args.check:
+        # Reported with cross-check results
+        return True
+    for source_file in sorted(index_missing):
+        for problem in index_missing[source_file]:
+            print(problem, file=sys.stderr)
+    for problem in index_problems:
+        print(problem, file=sys.stderr)
+    del index_problems[:]
+    return not index_missing
+
+
+def outputs_write(monster_names=None):
+    """Create outputs from monsters dict (or only the named monsters).
+    Returns False if check found problems.
+    """
+    if args.csv:
+        csv_open()
+    elif args.pdf:
+        del elements[:]
+        card_keys.clear()
+    plain = list()
+    if monster_names is None:
+        monsters_sorted = sorted(monsters.keys())
+    else:
+        monsters_sorted = monster_names
+    # Process monsters dict
+    for name in monsters_sorted:
+        monster = monsters[name]
+        # Check
+        if args.check:
+            index_check(monster)
+        # CSV
+        elif args.csv:
+            csv_write_row(monster)
+        # PDF
+        elif args.pdf:
+            pdf_create_page(monster)
+        # YAML
+        elif args.yaml:
+            yaml_write(monster)
+        # Plain
+        elif args.plain:
+            entry = plain_entry(monster, args.width)
+            if args.stream:
+                plain_write(entry)
+            else:
+                plain.append(entry)
+    # Write buffered plain text all at once
+    if plain:
+        plain_write(u"".join(plain))
+    # Complete index creation
+    if args.index:
+        index_write(monsters_sorted)
+    # Report index problems
+    for problem in collections.OrderedDict.fromkeys(index_problems):
+        print(problem, file=sys.stderr)
+    success = not (args.check and index_problems)
+    del index_problems[:]
+    # Complete PDF document creation
+    if args.pdf:
+        pdf_build()
+    elif args.csv and args.csv != "-":
+        csvwriter.stream.close()
+    sys.stdout.flush()
+    return success
+
+
+def decks_group():
+    """Return dict of deck names and sorted names of monsters grouped by
+    setting, descriptive tags, or organization tags (monsters may be in
+    several tag decks).
+    """
+    decks = collections.defaultdict(list)
+    for name in sorted(monsters.keys()):
+        m = monsters[name]
+        if args.split_by == "setting":
+            groups = [m["setting"]]
+        elif args.split_by == "org":
+            groups = m["tags_org"]
+        else:
+            groups = m["tags_desc"]
+        for group in groups:
+            if group:
+                decks[group].append(name)
+    return decks
+
+
+def deck_write(deck):
+    """Create output for a single deck (run in a worker process, so changing
+    output arguments only affects this deck). Returns deck name, output path,
+    monster count, and seconds taken.
+    """
+    name, path, monster_names = deck
+    start = time.time()
+    if args.pdf:
+        args.pdf = path
+    else:
+        args.csv = path
+    outputs_write(monster_names)
+    return name, path, len(monster_names), time.time() - start
+
+
+def decks_write():
+    """Create outputs for all decks concurrently and print timing summary.
+    """
+    start = time.time()
+    decks = decks_group()
+    if args.pdf:
+        directory, extension = os.path.abspath(args.pdf), "pdf"
+    else:
+        directory, extension = os.path.abspath(args.csv), "csv"
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    jobs = list()
+    for name in sorted(decks):
+        file_name = name.replace(" ", "_").lower()
+        path = os.path.join(directory, "%s.%s" % (file_name, extension))
+        jobs.append((name, path, decks[name]))
+    # Worker processes are forked with parsed monsters, fonts, and styles
+    pool = multiprocessing.Pool()
+    try:
+        results = pool.map(deck_write, jobs, chunksize=1)
+    finally:
+        pool.close()
+        pool.join()
+    for name, path, count, seconds in results:
+        print(u"%-24s %4d monsters %6.2fs  %s" % (name, count, seconds, path),
+              file=sys.stderr)
+    # Monsters may be in several tag decks (or none), so count each once
+    included = set()
+    for names in decks.values():
+        included.update(names)
+    total = u"Total (%d decks)" % len(results)
+    seconds = time.time() - start
+    print(u"%-24s %4d monsters %6.2fs" % (total, len(included), seconds),
+          file=sys.stderr)
+    if len(included) < len(monsters):
+        print(u"%d monster(s) without %s not included"
+              % (len(monsters) - len(included), args.split_by),
+              file=sys.stderr)
+
+
+def sources_update(sources, current):
+    """Parse changed source files and recreate outputs. Files that fail to
+    parse keep their previous modification time in current (none if new), so
+    they are parsed again on the next poll.
+    """
+    start = time.time()
+    changed = [p for p in current if current[p] != sources.get(p)]
+    for path in sources:
+        if path not in current:
+            source_remove(path)
+    # Parse each file separately, so one bad file does not prevent parsing
+    # the others (XML before YAML, as in sources_parse)
+    failed = list()
+    for path in sorted(changed, key=source_order):
+        try:
+            sources_parse([path])
+        except (EnvironmentError, ValueError, yaml.YAMLError,
+                ElementTree.ParseError) as e:
+            print(e, file=sys.stderr)
+            failed.append(path)
+            current[path] = sources.get(path)
+    if failed or not sources_report():
+        print("Outputs not recreated", file=sys.stderr)
+        return
+    outputs_write()
+    print("Recreated outputs from %d changed file(s) in %.2fs"
+          % (len(changed), time.time() - start), file=sys.stderr)
+
+
+def sources_watch(interval=1.0, debounce=0.5):
+    """Parse source files, create outputs, then poll source files and
+    recreate outputs from changed files (until interrupted).
+    """
+    sources = sources_find()
+    print("Watching %d source file(s) for changes (Ctrl-C to stop)"
+          % len(sources), file=sys.stderr)
+    try:
+        # First parse is handled like any change, so broken files are retried
+        current, sources = sources, dict()
+        sources_update(sources, current)
+        sources = current
+        while True:
+            time.sleep(interval)
+            current = sources_find()
+            if current == sources:
+                continue
+            # Wait for changes to settle (editors may write in several steps)
+            settled = None
+            while current != settled:
+                settled = current
+                time.sleep(debounce)
+                current = sources_find()
+            sources_update(sources, current)
+            sources = current
+    except KeyboardInterrupt:
+        pass
+
+
 # Setup
 args = parser_setup()
 if args.yaml:
@@ -648,16 +1170,6 @@ if args.back_pdf or args.pdf:
     else:
         elements = list()
         frames = list()
-        pages = list()
-
-        doc = BaseDocTemplate(args.pdf, pagesize=landscape(letter),
-                              showBoundry=True,
-                              leftMargin=horizontal_margin,
-                              rightMargin=horizontal_margin,
-                              topMargin=vertical_margin,
-                              bottomMargin=vertical_margin,
-                              title="Dungeon World Monster Cards",
-                              allowSplitting=False)
 
         # Default font and bullet
         menlo_path = "/System/Library/Fonts/Menlo.ttc"
@@ -716,54 +1228,15 @@ if args.back_pdf or args.pdf:
         style_title = style_default.clone("title")
         style_title.fontName = font_title
         style_title.fontSize = 20
-# CSV
-elif args.csv:
-    if args.csv == "-":
-        csv_path = sys.stdout
-    else:
-        csv_path = os.path.abspath(args.csv)
-        csv_path = open(args.csv, "wb")
-    csvwriter = UnicodeWriter(csv_path, quoting=csv.QUOTE_ALL,
-                              lineterminator="\n")
-    csvwriter.writerow(("name", "tags", "hp", "armor", "weapon",
-                        "qualities", "instinct", "moves", "description",
-                        "reference", "setting", "setting_reference"))
 
 # Create monsters dict from parse files and create outputs
-if args.file:
-    for file_glob in args.file:
-        for path in glob.iglob(file_glob):
-            if os.path.exists(path):
-                path = os.path.abspath(path)
-                if path.endswith(".xml"):
-                    xml_files.add(path)
-                if path.endswith(".yml") or path.endswith(".yaml"):
-                    yaml_files.add(path)
-    if xml_files:
-        with open("index.yaml", "r") as stream:
-            index = yaml.safe_load(stream)
-        for xml_file in xml_files:
-            parse_xml(xml_file)
-    for yaml_file in yaml_files:
-        parse_yaml(yaml_file)
-    monsters_sorted = sorted(monsters.keys())
-    # Process monsters dict
-    for name in monsters_sorted:
-        monster = monsters[name]
-        # CSV
-        if args.csv:
-            csv_write_row(monster)
-        # PDF
-        elif args.pdf:
-            pdf_create_page(monster)
-        # YAML
-        elif args.yaml:
-            yaml_write(monster)
-        # Plain
-        else:
-            plain_write(monster)
-    # Complete PDF document creation
-    if args.pdf:
-        pages.append(PageTemplate(frames=frames))
-        doc.addPageTemplates(pages)
-        doc.build(elements)
+if args.watch:
+    sources_watch()
+elif args.file:
+    sources_parse(sources_find())
+    if not sources_report():
+        sys.exit(1)
+    if args.split_by:
+        decks_write()
+    elif not outputs_write():
+        sys.exit(1)